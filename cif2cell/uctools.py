@@ -39,6 +39,7 @@ from cif2cell.spacegroupdata import Hex2RhombHall, Number2Hall, HM2Hall, Hall2Nu
 from cif2cell.elementdata import ElementData
 
 ################################################################################################
+ed = ElementData()
 
 
 class CellData(GeometryObject):
@@ -605,13 +606,15 @@ class CellData(GeometryObject):
         if self.primcell:
             if len(self.transvecs) > 1:
                 redundant = set([])
+                translations = VectorIndex()
+                for op in self.symops:
+                    translations.add(op.translation, op)
                 for op1 in self.symops:
-                    for op2 in self.symops:
-                        for vec in self.transvecs:
-                            if op1.translation+vec == op2.translation:
-                                if op1.rotation == op2.rotation:
-                                    if op1.translation.length() < op2.translation.length():
-                                        redundant.add(op2)
+                    for vec in self.transvecs:
+                        for op2 in translations.find(op1.translation+vec):
+                            if op1.rotation == op2.rotation:
+                                if op1.translation.length_sq() < op2.translation.length_sq():
+                                    redundant.add(op2)
                 self.symops -= redundant
 
         # Space group operations to cartesian representation
@@ -633,7 +636,7 @@ class CellData(GeometryObject):
                                         "The cell is given in some non-standard setting presently not handled by the program.")
         else:
             for op in self.symops:
-                if not op.translation.length() > self.compeps:
+                if not op.translation.length_sq() > self.compeps**2:
                     fails = False
                     for vec1 in lv:
                         transvec = vec1.transform(op.rotation)
@@ -700,32 +703,34 @@ class CellData(GeometryObject):
             self.ineqsites.pop(i)
             self.occupations.pop(i)
 
-        # Work out all sites in the cell for atomdata/atomset
-        for a in self.atomdata:
-            for op in self.symops:
-                # position expression string
-                posexpr = [s for s in op.eqsite]
-                for k in range(3):
-                    # position expression string, replacing x,y,z with numbers
-                    posexpr[k] = posexpr[k].replace('x', str(a[0].position[0]))
-                    posexpr[k] = posexpr[k].replace('y', str(a[0].position[1]))
-                    posexpr[k] = posexpr[k].replace('z', str(a[0].position[2]))
-                position = LatticeVector(
-                    [safe_matheval(pos) for pos in posexpr])
+        # Work out all sites in the cell for atomdata/atomset.
+        # The operations have been transformed to cartesian coordinates above,
+        # so each one is applied to all representative sites in lattice
+        # coordinates as given by its "x,y,z" representation. The operations
+        # are taken in a fixed order so that the order of the sites does not
+        # depend on how the set of operations happens to be hashed.
+        reppositions = [a[0].position for a in self.atomdata]
+        genpositions = []
+        for op in sorted(self.symops, key=lambda op: op.key()):
+            genpositions.append(apply_symop_batch(
+                op.rotmat(), op.transvec(), reppositions))
+        for i in range(len(self.atomdata)):
+            a = self.atomdata[i]
+            sitepositions = VectorIndex()
+            sitepositions.add(a[0].position)
+            for positions in genpositions:
+                position = positions[i]
                 b = AtomSite(
                     position=position, species=a[0].species, charges=a[0].charges, label=a[0].label)
                 self.atomset.add(b)
                 append = True
-                for site in a:
-                    for vec in self.transvecs:
-                        t = vec + b.position
-                        if site.position == t:
-                            append = False
-                            break
-                    if not append:
+                for vec in self.transvecs:
+                    if vec + b.position in sitepositions:
+                        append = False
                         break
                 if append:
                     a.append(b)
+                    sitepositions.add(b.position)
         # Transform positions. Note that atomdata and atomset alias the same data,
         # so we only transform once.
         for a in self.atomdata:
@@ -737,12 +742,13 @@ class CellData(GeometryObject):
         # Attempts to handle this on the fly from the beginning made a complete
         # mess of the alloy handling...
         removeindices = set([])
-        for i in range(len(self.atomdata)):
-            for j in range(len(self.atomdata[i])):
-                for k in range(i+1, len(self.atomdata)):
-                    for l in range(len(self.atomdata[k])):
-                        if self.atomdata[i][j].position == self.atomdata[k][l].position:
-                            removeindices.add((k, l))
+        earlierpositions = VectorIndex()
+        for k in range(len(self.atomdata)):
+            for l in range(len(self.atomdata[k])):
+                if self.atomdata[k][l].position in earlierpositions:
+                    removeindices.add((k, l))
+            for site in self.atomdata[k]:
+                earlierpositions.add(site.position)
         removeindices = list(removeindices)
         removeindices.sort(reverse=True)
         for i, j in removeindices:
@@ -918,16 +924,22 @@ class CellData(GeometryObject):
             op.translation = LatticeVector(
                 mvmult3(invmapmatrix, op.translation))
 
-        # Operate with new translation group on coordinates to generate all positions
+        # Operate with new translation group on coordinates to generate all positions.
+        # The new sites share the species and charge dictionaries of the site they
+        # are generated from, and the sum of two LatticeVectors is already in the
+        # cell, so only the new position needs to be constructed per site. The
+        # folded sum is snapped to the conspicuous numbers once more, as the
+        # LatticeVector constructor would do (2/3+2/3 should give exactly 1/3).
         newsites = []
         i = 0
         for a in self.atomdata:
             newsites.append([])
             for b in a:
                 for translation in newtranslations:
-                    position = LatticeVector(b.position + translation)
-                    t = AtomSite(position=b.position,
-                                 species=b.species, charges=b.charges)
+                    t = AtomSite(species=b.species, charges=b.charges)
+                    position = b.position + translation
+                    position.improveprecision()
+                    position.intocell()
                     t.position = position
                     newsites[i].append(t)
             i += 1
@@ -1032,7 +1044,7 @@ class CellData(GeometryObject):
             else:
                 for op in self.symops:
                     for vec in lv:
-                        t = Vector(mvmult3(op.rotation, vec))
+                        t = Vector(mvmult3_row(op.rotation_T, vec))
                         r = Vector([-u for u in t])
                         # Symmetry operation OK if it maps a lattice vector into one of the other lattice vectors
                         equivalent = t == lv[0] or t == lv[1] or t == lv[2] or \
@@ -1050,7 +1062,7 @@ class CellData(GeometryObject):
             # Remove broken symmetries
             for op in self.symops:
                 for vec in lv:
-                    t = Vector(mvmult3(op.rotation, vec))
+                    t = Vector(mvmult3_row(op.rotation_T, vec))
         else:
             # Otherwise just keep identity
             self.symops = set([SymmetryOperation(['x', 'y', 'z'])])
@@ -1431,7 +1443,7 @@ class CellData(GeometryObject):
         self.elements[:] = [element[0].upper()+element[1:].lower()
                             for element in self.elements]
         for element in self.elements:
-            if not element in ElementData().elementnr:
+            if not element in ed.elementnr:
                 sys.stderr.write("***Warning: "+element +
                                  " is not a chemical element.\n")
         # Find occupancies
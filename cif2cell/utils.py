@@ -21,7 +21,10 @@
 #  ORCID:       0000-0002-1154-9846
 #
 #******************************************************************************************
-from math import sqrt,acos,pi
+import re
+from bisect import bisect_left
+from math import sqrt,acos,pi,floor,ceil,copysign
+from functools import lru_cache
 from cif2cell.elementdata import ElementData
 ################################################################################################
 # Miscellaneous
@@ -38,6 +41,12 @@ sixth = one/six
 occepsilon = 0.000001
 #floatlist = [third, 2*third, half, fourth, one, zero, sqrt(2.0),sixth,5*sixth,sqrt(3.0),sqrt(3.0)/2]
 floatlist = [third, 2*third]
+# Sorted copy of floatlist for the bisection in improveprecision, and the
+# contents of floatlist it was made from, so that it can be rebuilt if
+# floatlist is changed.
+sortedfloatlist = sorted(floatlist)
+sortedfloatlistsource = list(floatlist)
+ed = ElementData()
 angtobohr = 1.8897261
 uperatogpercm = 1.6605388
 uperautogpercm = 11.205871
@@ -112,7 +121,10 @@ class GeometryObject:
     Parent class for anything geometrical contains:
     compeps    : epsilon for determining when two floats are equal
     invcompeps : 1/compeps
+    Subclasses that are created in large numbers declare __slots__ to do
+    without a per-instance __dict__.
     """
+    __slots__ = ()
     def __init__(self,compeps=0.0002):
         self.compeps = compeps
         self.invcompeps = 1./self.compeps
@@ -137,22 +149,14 @@ class Charge(float):
     Class for representing the charge state/oxidation number of an atom (ion).
     It is just an integer, except for a modified routine for turning into a string,
     viz. a two plus ion gets the string representation '2+'
+    The string is worked out once on construction.
     """
-    def __init__(self,i):
-        float.__init__(self)
+    def __new__(cls,i):
+        self = float.__new__(cls,i)
+        self.string = chargestring(float(self))
+        return self
     def __str__(self):
-        if abs(self-int(self)) < 0.0001:
-            if int(self) == 0:
-                return '0'
-            elif self > 0:
-                return str(abs(int(self)))+'+'
-            elif self < 0:
-                return str(abs(int(self)))+'-'
-        else:
-            if self > 0:
-                return str(abs(self))+"+"
-            else:
-                return str(abs(self))+"-"
+        return self.string
 
 class Vector(list,GeometryObject):
     """
@@ -164,34 +168,34 @@ class Vector(list,GeometryObject):
       vectors are added component-wise.
     More methods:
     length            : returns the euclidean norm of the vector
+    length_sq         : returns the squared euclidean norm of the vector
+    key(eps)          : the coordinates rounded to integer multiples of eps
     transform(matrix) : returns matrix*vector
     improveprecision  : identify some conspicuous numbers and improve precision
     """
     def __init__(self, vec, *args, **kwargs):
         GeometryObject.__init__(self, *args, **kwargs)
         list.__init__(self, [float(v) for v in vec])
+    # Hash of the coordinates rounded to multiples of compeps, so that identical
+    # vectors (up to rounding) hash identically while distinct ones are spread out.
     def __hash__(self):
-        t = self.invcompeps*self[0]+1.1*self.invcompeps*self[1]+1.2*self.invcompeps*self[2]
-        return int(round(t))
+        return hash(self.key())
     def __eq__(self,other):
-        for i in range(3):
-            if abs(self[i]-other[i]) > self.compeps:
-                return False
-        return True
+        eps = self.compeps
+        return abs(self[0]-other[0]) <= eps and \
+               abs(self[1]-other[1]) <= eps and \
+               abs(self[2]-other[2]) <= eps
     def __lt__(self, other):
-        sl = self[0]**2+self[1]**2+self[2]**2
-        ol = other[0]**2+other[1]**2+other[2]**2
-        return sl < ol
+        x, y, z = other[0], other[1], other[2]
+        return self.length_sq() < x*x+y*y+z*z
     # Addition of two vectors
     def __add__(self, other):
-        t = Vector([self[i]+other[i] for i in range(3)])
-        return t
+        return Vector([self[0]+other[0], self[1]+other[1], self[2]+other[2]])
     # Subtraction of two vectors
     def __sub__(self, other):
-        t = Vector([self[i]-other[i] for i in range(3)])
-        return t
+        return Vector([self[0]-other[0], self[1]-other[1], self[2]-other[2]])
     def __neg__(self):
-        return Vector([-t for t in self])
+        return Vector([-self[0], -self[1], -self[2]])
     def __str__(self):
         s = ""
         for e in self:
@@ -202,19 +206,25 @@ class Vector(list,GeometryObject):
         return s
     # Length of the vectors
     def length(self):
-        return sqrt(self[0]**2+self[1]**2+self[2]**2)
+        x, y, z = self[0], self[1], self[2]
+        return sqrt(x*x+y*y+z*z)
+    # Squared length, for when only relative lengths matter
+    def length_sq(self):
+        x, y, z = self[0], self[1], self[2]
+        return x*x+y*y+z*z
+    # The coordinates rounded to integer multiples of eps (default compeps)
+    def key(self, eps=None):
+        if eps is None:
+            inv = self.invcompeps
+        else:
+            inv = 1/eps
+        return (int(round(self[0]*inv)), int(round(self[1]*inv)), int(round(self[2]*inv)))
     # Multiplication by scalar
     def scalmult(self, a):
-        t = []
-        for i in range(3):
-            t.append(self[i]*a)
-        return Vector(t)
+        return Vector([self[0]*a, self[1]*a, self[2]*a])
     # dot product
     def dot(self,a):
-        t = 0.0
-        for i in range(3):
-            t += self[i]*a[i]
-        return t
+        return self[0]*a[0] + self[1]*a[1] + self[2]*a[2]
     # triple product
     def triple(self,a,b,c):
         t = [a,b,c]
@@ -231,6 +241,47 @@ class Vector(list,GeometryObject):
     def angle(self, other):
         return acos(self.dot(other)/(self.length() * other.length()))
 
+class VectorIndex:
+    """
+    Lookup table of vectors (with optional associated items) that finds the
+    entries equal to a given vector, in the sense of Vector.__eq__, without
+    comparing against every entry.
+    The vectors are binned by their key on a grid of three times compeps, so any
+    equal vector is in the same bin or in the neighbouring bin towards which the
+    vector is displaced from its bin centre. This makes a lookup 8 comparisons
+    of bins irrespective of the number of entries.
+    add(vec,item) : add vec with an associated item
+    find(vec)     : list of the items of all entries equal to vec
+    """
+    def __init__(self):
+        self.bins = {}
+    def add(self, vec, item=None):
+        k = vec.key(3*vec.compeps)
+        try:
+            self.bins[k].append((vec, item))
+        except KeyError:
+            self.bins[k] = [(vec, item)]
+    def find(self, vec):
+        inv = vec.invcompeps/3
+        ranges = []
+        for i in range(3):
+            a = vec[i]*inv
+            r = int(round(a))
+            if a >= r:
+                ranges.append((r, r+1))
+            else:
+                ranges.append((r-1, r))
+        items = []
+        for i in ranges[0]:
+            for j in ranges[1]:
+                for k in ranges[2]:
+                    for v, item in self.bins.get((i, j, k), ()):
+                        if v == vec:
+                            items.append(item)
+        return items
+    def __contains__(self, vec):
+        return len(self.find(vec)) > 0
+
 class LatticeVector(Vector):
     """
     Vector of length three that maps back things into the cell
@@ -247,7 +298,7 @@ class LatticeVector(Vector):
     def __add__(self, other):
         if self.interval[0] != other.interval[0] or self.interval[1] != other.interval[1]:
             raise GeometryObjectError("LatticeVectors must have the same definition intervals to be added.")
-        t = LatticeVector([self[i]+other[i] for i in range(3)])
+        t = LatticeVector([self[0]+other[0], self[1]+other[1], self[2]+other[2]])
         t.intocell()
         return t
     # Change interval
@@ -260,13 +311,26 @@ class LatticeVector(Vector):
         t = LatticeVector(mvmult3(matrix, self))
         t.intocell()
         return t
-    # Put the vector components into the cell interval defined by self.interval
+    # Put the vector components into the cell interval defined by self.interval.
+    # Components are shifted by the required number of periods in one step rather
+    # than one period at a time, so the cost does not grow with the distance from the cell.
+    # Rounding can make the step miss by one period, so finish off with the original
+    # loops, which then run at most once.
     def intocell(self):
+        lo = self.interval[0]
+        hi = self.interval[1]-self.compeps
+        width = self.interval[1]-self.interval[0]
         for i in range(3):
-            while self[i] < self.interval[0]:
-                self[i] += 1.0
-            while self[i] >= self.interval[1]-self.compeps:
-                self[i] -= 1.0
+            x = self[i]
+            if x < lo:
+                x += ceil((lo-x)/width)*width
+            if x >= hi:
+                x -= (floor((x-hi)/width)+1)*width
+            while x < lo:
+                x += 1.0
+            while x >= hi:
+                x -= 1.0
+            self[i] = x
 
 class LatticeMatrix(GeometryObject, list):
     """
@@ -278,22 +342,21 @@ class LatticeMatrix(GeometryObject, list):
         for vec in mat:
             t.append(Vector(vec))
         list.__init__(self, t)
-    # no idea whether this is a clever choice of hash function...
+    # Combine the hashes of the rows
     def __hash__(self):
-        t = self.invcompeps*(self[0][0] + self[0][1] + self[0][2] +\
-                             self[0][0] + self[0][1] + self[0][2] +\
-                             self[0][0] + self[0][1] + self[0][2])
-        return int(t)
+        return hash((hash(self[0]), hash(self[1]), hash(self[2])))
     def __str__(self):
         matstr = ""
         for l in self:
             matstr += str(l)+"\n"
         return matstr
     def __eq__(self,other):
+        eps = self.compeps
         for i in range(3):
-            for j in range(3):
-                if abs(self[i][j]-other[i][j]) > self.compeps:
-                    return False
+            s = self[i]
+            o = other[i]
+            if abs(s[0]-o[0]) > eps or abs(s[1]-o[1]) > eps or abs(s[2]-o[2]) > eps:
+                return False
         return True
     # coordinate transformation
     def transform(self, matrix):
@@ -333,6 +396,7 @@ class AtomSite(GeometryObject):
         alloy     : true if there are more than one species occupying the site
 
     """
+    __slots__ = ('position','species','label','charges','index','compeps','invcompeps')
     def __init__(self,position=None,species=None,label="",charges=None,index=None):
         GeometryObject.__init__(self)
         if not position is None:
@@ -364,7 +428,7 @@ class AtomSite(GeometryObject):
         t = []
         for k in self.species:
             t.append(k)
-        t.sort(key = lambda x: ElementData().elementweight[x], reverse=True)
+        t.sort(key = lambda x: ed.elementweight[x], reverse=True)
         tmp = ""
         for k in t:
             tmp += k+separator
@@ -394,26 +458,22 @@ class AtomSite(GeometryObject):
         t = []
         if covalent:
             for sp in self.species.keys():
-                try:
-                    t.append(ElementData().CovalentRadius2[sp])
-                except:
-                    pass
+                r = ed.CovalentRadius2.get(sp)
+                if r is not None:
+                    t.append(r)
         else:
             for sp,ch in self.charges.items():
-                try:
-                    t.append(ElementData().IonicRadius[sp+str(ch)])
-                except:
-                    try:
-                        t.append(ElementData().CovalentRadius2[sp])
-                    except:
-                        pass
-        try:
-            if size == "min":
-                return min(t)
-            else:
-                return max(t)
-        except:
+                r = ed.IonicRadius.get(sp+str(ch))
+                if r is None:
+                    r = ed.CovalentRadius2.get(sp)
+                if r is not None:
+                    t.append(r)
+        if not t:
             return None
+        if size == "min":
+            return min(t)
+        else:
+            return max(t)
     #
     # The distance to another atom site
     def distance(self,other):
@@ -423,7 +483,12 @@ class AtomSite(GeometryObject):
 class SymmetryOperation(GeometryObject):
     """
     Class describing a symmetry operation, with a rotation matrix and a translation.
+    rotation_T : the transpose of the rotation matrix as a tuple of rows, for
+                 use with mvmult3_row. Kept up to date whenever rotation is set.
+    key()      : rotation and translation rounded to multiples of compeps, for
+                 ordering operations independently of their hashes
     """
+    __slots__ = ('eqsite','_rotation','rotation_T','translation','compeps','invcompeps')
     def __init__(self, eqsite=None):
         GeometryObject.__init__(self)
         self.eqsite = eqsite
@@ -434,19 +499,33 @@ class SymmetryOperation(GeometryObject):
             self.rotation = None
             self.translation = None
     def __hash__(self):
-        return hash(self.rotation)+hash(self.translation)
+        return hash((hash(self._rotation), hash(self.translation)))
+    @property
+    def rotation(self):
+        return self._rotation
+    @rotation.setter
+    def rotation(self, rotation):
+        self._rotation = rotation
+        if rotation is None:
+            self.rotation_T = None
+        else:
+            self.rotation_T = tuple(zip(*rotation))
     # This way of printing was useful for outputting to CASTEP.
     def __str__(self):
         return str(self.rotation)+str(self.translation)+"\n"
     # Two symmetry operations are equal if rotation matrices and translation vector
     # differ by at most compeps
     def __eq__(self, other):
-        eq = True
+        eps = self.compeps
+        # read the rotations once, rather than through the property for every row
+        srot = self._rotation
+        orot = other._rotation
         for i in range(3):
-            for j in range(3):
-                eq = eq and abs(self.rotation[i][j] - other.rotation[i][j]) < self.compeps
-            eq = eq and self.translation == other.translation
-        return eq
+            s = srot[i]
+            o = orot[i]
+            if not (abs(s[0]-o[0]) < eps and abs(s[1]-o[1]) < eps and abs(s[2]-o[2]) < eps):
+                return False
+        return self.translation == other.translation
     # Comparison between operations made by comparing lengths of translation vectors,
     # whether the rotation is diagonal and the identity is always less than anything else.
     # That way we only need to sort a list of operations to get identity first (and a reasonably
@@ -467,45 +546,38 @@ class SymmetryOperation(GeometryObject):
         else:
             return False
         return self.translation < other.translation
+    # Rotation and translation rounded to integer multiples of compeps, for
+    # ordering operations independently of their hashes
+    def key(self):
+        inv = self.invcompeps
+        r = self._rotation
+        return (int(round(r[0][0]*inv)), int(round(r[0][1]*inv)), int(round(r[0][2]*inv)),
+                int(round(r[1][0]*inv)), int(round(r[1][1]*inv)), int(round(r[1][2]*inv)),
+                int(round(r[2][0]*inv)), int(round(r[2][1]*inv)), int(round(r[2][2]*inv))) + \
+                self.translation.key()
     # Return a rotation matrix from "x,y,z" representation of a symmetry operation
     # !!!With respect to cartesian axes!!!
     def rotmat(self):
-        mat = [[0.,0.,0.],[0.,0.,0.],[0.,0.,0.]]
-        for j in range(len(self.eqsite)):
-            xyz = self.eqsite[j].replace('+',' +').replace('-',' -').split()
-            for i in xyz:
-                if i.strip("+-") == 'x':
-                    mat[0][j] = float(i.strip('x')+"1")
-                elif i.strip("+-") == 'y':
-                    mat[1][j] = float(i.strip('y')+"1")
-                elif i.strip("+-") == 'z':
-                    mat[2][j] = float(i.strip('z')+"1")
-        return LatticeMatrix(mat)
+        return LatticeMatrix(symop_rotation_translation(tuple(self.eqsite))[0])
     # Return a translation vector from "x,y,z" representation of a symmetry operation
     def transvec(self):
-        vec = []
-        for i in range(3):
-            vec.append(0.0)
-        for j in range(len(self.eqsite)):
-            xyz = self.eqsite[j].replace('+',' +').replace('-',' -').split()
-            for i in xyz:
-                if i.strip("+-xyz") != "":
-                    vec[j] = safe_matheval(i)
-        return LatticeVector(vec)
+        return LatticeVector(symop_rotation_translation(tuple(self.eqsite))[1])
     # True if the operation is diagonal
     def diagonal(self):
-        if abs(self.rotation[0][1]) < self.compeps and \
-           abs(self.rotation[0][2]) < self.compeps and \
-           abs(self.rotation[1][0]) < self.compeps and \
-           abs(self.rotation[1][2]) < self.compeps and \
-           abs(self.rotation[2][0]) < self.compeps and \
-           abs(self.rotation[2][1]) < self.compeps:
+        r = self._rotation
+        eps = self.compeps
+        if abs(r[0][1]) < eps and \
+           abs(r[0][2]) < eps and \
+           abs(r[1][0]) < eps and \
+           abs(r[1][2]) < eps and \
+           abs(r[2][0]) < eps and \
+           abs(r[2][1]) < eps:
             return True
         else:
             return False
     # Operate on a vector and return the result
     def operate(self,vector):
-        t = Vector(mvmult3(self.rotation, vector)) + self.translation
+        t = Vector(mvmult3_row(self.rotation_T, vector)) + self.translation
         return t
     def improveprecision(self):
         self.rotation = self.rotation.improveprecision()
@@ -528,86 +600,230 @@ def safe_matheval(expr):
     sexpr = expr.replace(" ","")
     return eval(sexpr,{"__builtins__":None},safe_dict)
 
+# Tokens of one component of a symmetry operation in "x,y,z" form, e.g. '-x+y+1/3':
+# an optional sign followed by a fraction, a decimal number or a coordinate.
+symoptoken = re.compile(r'([+-]?)\s*(?:(\d+)\s*/\s*(\d+)|(\d+\.?\d*|\.\d+)|([xyz]))')
+symopcomponents = {}
+# Parse one component of a symmetry operation and return the coefficients of
+# (x,y,z) and the constant term. The same few strings recur in all space groups,
+# so the results are cached.
+def parse_symop_component(string):
+    try:
+        return symopcomponents[string]
+    except KeyError:
+        pass
+    coeffs = [0.0, 0.0, 0.0]
+    trans = 0.0
+    pos = 0
+    for m in symoptoken.finditer(string):
+        sign, num, den, dec, coord = m.groups()
+        # Anything between tokens, or terms not separated by a sign (as in '2x'), is an error
+        if string[pos:m.start()].strip() != "" or (pos > 0 and sign == ""):
+            raise SymmetryError("Could not parse symmetry operation component '"+string+"'.")
+        pos = m.end()
+        if coord:
+            if sign == '-':
+                coeffs['xyz'.index(coord)] -= 1.0
+            else:
+                coeffs['xyz'.index(coord)] += 1.0
+        else:
+            if num:
+                if int(den) == 0:
+                    raise SymmetryError("Zero denominator in symmetry operation component '"+string+"'.")
+                t = int(num)/int(den)
+            else:
+                t = float(dec)
+            if sign == '-':
+                trans -= t
+            else:
+                trans += t
+    if pos == 0 or string[pos:].strip() != "":
+        raise SymmetryError("Could not parse symmetry operation component '"+string+"'.")
+    symopcomponents[string] = (tuple(coeffs), trans)
+    return symopcomponents[string]
+
+# String representation of a charge state ('2+', '0', '0.5-', ...).
+# Only a handful of different charges ever occur, so the results are cached.
+@lru_cache(maxsize=None)
+def chargestring(c):
+    if abs(c-int(c)) < 0.0001:
+        if int(c) == 0:
+            return '0'
+        elif c > 0:
+            return str(abs(int(c)))+'+'
+        elif c < 0:
+            return str(abs(int(c)))+'-'
+    else:
+        if c > 0:
+            return str(abs(c))+"+"
+        else:
+            return str(abs(c))+"-"
+
+# Rotation matrix (as in SymmetryOperation.rotmat) and translation of a symmetry
+# operation given as a tuple of "x,y,z" strings, as tuples. The same space groups
+# are set up over and over, so each operation is only parsed once.
+@lru_cache(maxsize=4096)
+def symop_rotation_translation(eqsite):
+    mat = [[0.,0.,0.],[0.,0.,0.],[0.,0.,0.]]
+    vec = [0.0, 0.0, 0.0]
+    for j in range(len(eqsite)):
+        coeffs, t = parse_symop_component(eqsite[j])
+        mat[0][j] = coeffs[0]
+        mat[1][j] = coeffs[1]
+        mat[2][j] = coeffs[2]
+        vec[j] = t
+    return tuple(tuple(row) for row in mat), tuple(vec)
+
 def removeerror(string):
     # Remove error estimates at the end of a number (as in 3.28(5))
     splitstr=string.split('(')
     return splitstr[0]
 
-# Guess the "true" values of some conspicuous numbers
+# Guess the "true" values of some conspicuous numbers.
+# Only the two entries of the sorted list around |x| need to be checked.
 def improveprecision(x,eps):
-    for f in floatlist:
-        if abs(abs(x)-f) <= eps:
-            # 0
-            return copysign(f,x)
+    global sortedfloatlist, sortedfloatlistsource
+    if floatlist != sortedfloatlistsource:
+        sortedfloatlist = sorted(floatlist)
+        sortedfloatlistsource = list(floatlist)
+    ax = abs(x)
+    i = bisect_left(sortedfloatlist, ax)
+    if i > 0 and ax-sortedfloatlist[i-1] <= eps:
+        return copysign(sortedfloatlist[i-1],x)
+    if i < len(sortedfloatlist) and sortedfloatlist[i]-ax <= eps:
+        return copysign(sortedfloatlist[i],x)
     # if no match found, return x
     return x
 
+# Apply a symmetry operation, given as a rotation matrix (in the convention of
+# SymmetryOperation.rotmat) and a translation, to all positions in a list in one go.
+# Returns a list of LatticeVectors mapped into the given interval.
+def apply_symop_batch(rotation, translation, positions, interval=(0.0, 1.0)):
+    r0 = rotation[0]
+    r1 = rotation[1]
+    r2 = rotation[2]
+    t0 = translation[0]
+    t1 = translation[1]
+    t2 = translation[2]
+    w = []
+    for p in positions:
+        x = p[0]
+        y = p[1]
+        z = p[2]
+        w.append(LatticeVector([r0[0]*x + r1[0]*y + r2[0]*z + t0,
+                                r0[1]*x + r1[1]*y + r2[1]*z + t1,
+                                r0[2]*x + r1[2]*y + r2[2]*z + t2], interval=interval))
+    return w
+
+# Add two vectors in lattice coordinates, subtracting the lattice translation
+# from any component that reaches +/-1.
 def latvectadd(a,b):
-    t = []
-    for i in range(3):
-        t.append(a[i]+b[i])
-        if abs(t[i]) >= 1-occepsilon:
-            t[i] = t[i] - copysign(1,t[i])
-        t[i] = improveprecision(t[i],occepsilon)
-    return t
+    lim = 1-occepsilon
+    x = a[0]+b[0]
+    y = a[1]+b[1]
+    z = a[2]+b[2]
+    if abs(x) >= lim:
+        x = x - copysign(1,x)
+    if abs(y) >= lim:
+        y = y - copysign(1,y)
+    if abs(z) >= lim:
+        z = z - copysign(1,z)
+    return [improveprecision(x,occepsilon),
+            improveprecision(y,occepsilon),
+            improveprecision(z,occepsilon)]
 
 def putincell(coords,coordepsilon):
-    # Put coordinates in the interval 0 <= x < 1
+    # Put coordinates in the interval 0 <= x < 1, shifting by the
+    # required number of lattice translations in one step. The step can
+    # fall one translation short when rounding swallows the excess, so
+    # finish off with the original loops.
+    hi = 1-coordepsilon
     for i in range(3):
+        x = coords[i]
         # first make the coordinate positive
-        while coords[i] < 0:
-            coords[i] = coords[i] + 1
+        if x < 0:
+            x = x + ceil(-x)
+            while x < 0:
+                x = x + 1
         # then put it in the primitive cell
-        while coords[i] > 1-coordepsilon:
-            coords[i] = coords[i] - 1
+        if x > hi:
+            x = x - ceil(x-hi)
+            while x > hi:
+                x = x - 1
+        coords[i] = x
     return coords
 
-# Determinant of 3x3 dimensional matrix
+# Determinant of 3x3 dimensional matrix.
+# The elements are bound to local names once instead of subscripting m repeatedly.
 def det3(m):
-    a = m[1][1]*m[2][2]-m[1][2]*m[2][1]
-    b = m[1][2]*m[2][0]-m[1][0]*m[2][2]
-    c = m[1][0]*m[2][1]-m[1][1]*m[2][0]
-    return m[0][0]*a + m[0][1]*b + m[0][2]*c
-
-# Inverse of 3x3 dimensional matrix
+    r = m[0]
+    m00, m01, m02 = r[0], r[1], r[2]
+    r = m[1]
+    m10, m11, m12 = r[0], r[1], r[2]
+    r = m[2]
+    m20, m21, m22 = r[0], r[1], r[2]
+    a = m11*m22-m12*m21
+    b = m12*m20-m10*m22
+    c = m10*m21-m11*m20
+    return m00*a + m01*b + m02*c
+
+# Inverse of 3x3 dimensional matrix.
+# The first column of cofactors is shared with the determinant.
 def minv3(m):
-    di = 1/det3(m)
-    w = [[(m[1][1]*m[2][2]-m[1][2]*m[2][1])*di, (m[0][2]*m[2][1]-m[0][1]*m[2][2])*di, (m[0][1]*m[1][2]-m[0][2]*m[1][1])*di],
-         [(m[1][2]*m[2][0]-m[1][0]*m[2][2])*di, (m[0][0]*m[2][2]-m[0][2]*m[2][0])*di, (m[0][2]*m[1][0]-m[0][0]*m[1][2])*di],
-         [(m[1][0]*m[2][1]-m[1][1]*m[2][0])*di, (m[0][1]*m[2][0]-m[0][0]*m[2][1])*di, (m[0][0]*m[1][1]-m[0][1]*m[1][0])*di]]
+    r = m[0]
+    m00, m01, m02 = r[0], r[1], r[2]
+    r = m[1]
+    m10, m11, m12 = r[0], r[1], r[2]
+    r = m[2]
+    m20, m21, m22 = r[0], r[1], r[2]
+    a = m11*m22-m12*m21
+    b = m12*m20-m10*m22
+    c = m10*m21-m11*m20
+    di = 1/(m00*a + m01*b + m02*c)
+    w = [[a*di, (m02*m21-m01*m22)*di, (m01*m12-m02*m11)*di],
+         [b*di, (m00*m22-m02*m20)*di, (m02*m10-m00*m12)*di],
+         [c*di, (m01*m20-m00*m21)*di, (m00*m11-m01*m10)*di]]
     return w
 
-# matrix-vector multiplication
+# matrix-vector multiplication (w[i] = sum_j mat[j][i]*vec[j]), written out explicitly
+# since the loop overhead dominates for 3x3 matrices.
 def mvmult3(mat,vec):
-    w = [0.,0.,0.]
-    for i in range(3):
-        t = 0
-        for j in range(3):
-            t = t + mat[j][i]*vec[j]
-        w[i] = t
-    return w
-
-# more efficient, but goes the other way...
-## def mvmult3(mat,vec):
-##     w = [0.,0.,0.]
-##     t = 0
-##     for i in range(3):
-##         r = mat[i]
-##         for j in range(3):
-##             t += r[j]*vec[j]
-##         w[i],t = t,0
-##     return w
+    m0 = mat[0]
+    m1 = mat[1]
+    m2 = mat[2]
+    v0 = vec[0]
+    v1 = vec[1]
+    v2 = vec[2]
+    return [m0[0]*v0 + m1[0]*v1 + m2[0]*v2,
+            m0[1]*v0 + m1[1]*v1 + m2[1]*v2,
+            m0[2]*v0 + m1[2]*v1 + m2[2]*v2]
+
+# matrix-vector multiplication in the natural row-major convention
+# (w[i] = sum_j mat[i][j]*vec[j]), i.e. mvmult3_row(transpose(mat),vec) == mvmult3(mat,vec)
+def mvmult3_row(mat,vec):
+    r0 = mat[0]
+    r1 = mat[1]
+    r2 = mat[2]
+    v0 = vec[0]
+    v1 = vec[1]
+    v2 = vec[2]
+    return [r0[0]*v0 + r0[1]*v1 + r0[2]*v2,
+            r1[0]*v0 + r1[1]*v1 + r1[2]*v2,
+            r2[0]*v0 + r2[1]*v1 + r2[2]*v2]
 
 # matrix-matrix multiplication
 def mmmult3(m1,m2):
+    b0 = m2[0]
+    b1 = m2[1]
+    b2 = m2[2]
     w = []
     for i in range(3):
-        w.append([])
-        for j in range(3):
-            t = 0
-            for k in range(3):
-                t += m1[i][k]*m2[k][j]
-            w[i].append(t)
+        a0 = m1[i][0]
+        a1 = m1[i][1]
+        a2 = m1[i][2]
+        w.append([a0*b0[0] + a1*b1[0] + a2*b2[0],
+                  a0*b0[1] + a1*b1[1] + a2*b2[1],
+                  a0*b0[2] + a1*b1[2] + a2*b2[2]])
     return w
 
 def crystal_system(spacegroupnr):
@@ -629,13 +845,6 @@ def crystal_system(spacegroupnr):
     else:
         return "unknown"
 
-# Return x with the sign of y
-def copysign(x, y):
-    if y >= 0:
-        return x
-    else:
-        return -x
-
 # Get rid of newline characters from a string, portably.
 # replace allows to specify a string to replace the newline
 # character with.
@@ -0,0 +1,181 @@
+
+import os
+import sys
+import math
+import random
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), os.path.pardir))
+from cif2cell.utils import *
+
+def putincell_loop(coords, coordepsilon):
+    # Reference implementation, shifting one lattice translation at a time.
+    coords = list(coords)
+    for i in range(3):
+        while coords[i] < 0:
+            coords[i] = coords[i] + 1
+        while coords[i] > 1-coordepsilon:
+            coords[i] = coords[i] - 1
+    return coords
+
+@pytest.mark.parametrize("x", [4.9998000000000005, 0.9998000000000005, -4.0002, -1e-17,
+                               1.0, -1.0, 0.9998, 5.0, -5.0, 0.0])
+def test_putincell_edges(x):
+    """Test putincell at the edges of the cell."""
+    result = putincell([x, 0.0, 0.0], 0.0002)
+    assert result[0] <= 1-0.0002
+    assert result == putincell_loop([x, 0.0, 0.0], 0.0002)
+
+def test_putincell_random():
+    """Test putincell against the reference loop on random coordinates."""
+    rng = random.Random(1)
+    for _ in range(10000):
+        coords = [rng.uniform(-5, 5) for _ in range(3)]
+        coords[0] = rng.randint(-5, 5) + rng.choice([0.0, 0.9998, -0.0002, 1e-16, -1e-16])
+        assert putincell(list(coords), 0.0002) == putincell_loop(coords, 0.0002)
+
+def intocell_loop(x, interval, compeps):
+    # Reference implementation, shifting one period at a time.
+    while x < interval[0]:
+        x += 1.0
+    while x >= interval[1]-compeps:
+        x -= 1.0
+    return x
+
+@pytest.mark.parametrize("interval", [(0.0, 1.0), (-0.5, 0.5)])
+@pytest.mark.parametrize("x", [5.9998, 7.9998, 0.9998, 0.4998, -0.5, 0.5, 1.0, -1.0,
+                               -4.0002, -1e-17, 4.9998000000000005, 0.0])
+def test_intocell_edges(x, interval):
+    """Test LatticeVector.intocell at the edges of the cell."""
+    v = LatticeVector([0.0, 0.0, 0.0], interval=interval)
+    v[0] = x
+    v.intocell()
+    assert v[0] < interval[1]-v.compeps
+    assert v[0] == intocell_loop(x, interval, v.compeps)
+
+def test_intocell_random():
+    """Test LatticeVector.intocell against the reference loop on random coordinates."""
+    rng = random.Random(3)
+    v = LatticeVector([0.0, 0.0, 0.0])
+    for _ in range(10000):
+        x = rng.randint(-8, 8) + rng.choice([0.0, 0.9998, -0.0002, 0.5, rng.random()])
+        v[0] = x
+        v.intocell()
+        assert v[0] == intocell_loop(x, v.interval, v.compeps)
+
+@pytest.mark.parametrize("string,expected", [
+    ("x", ((1.0, 0.0, 0.0), 0.0)),
+    ("-y", ((0.0, -1.0, 0.0), 0.0)),
+    ("x-y", ((1.0, -1.0, 0.0), 0.0)),
+    ("-x+y+1/3", ((-1.0, 1.0, 0.0), 1/3)),
+    ("1/2+z", ((0.0, 0.0, 1.0), 0.5)),
+    (" z - 1/4 ", ((0.0, 0.0, 1.0), -0.25)),
+    ("y+0.5", ((0.0, 1.0, 0.0), 0.5)),
+    ("-x+.25", ((-1.0, 0.0, 0.0), 0.25)),
+    ])
+def test_parse_symop_component(string, expected):
+    """Test parsing of symmetry operation components."""
+    assert parse_symop_component(string) == expected
+
+@pytest.mark.parametrize("string", ["2x", "x2", "xy", "x+", "x*2", "1/0+x", "x+a", "", "x,y"])
+def test_parse_symop_component_malformed(string):
+    """Test that malformed symmetry operation components are rejected."""
+    with pytest.raises(SymmetryError):
+        parse_symop_component(string)
+
+def test_vectorindex_find():
+    """Test VectorIndex.find against a linear scan, with points near the bin edges."""
+    rng = random.Random(2)
+    eps = 0.0002
+    def coordinate():
+        # Either anywhere in a small range, or close to an edge between two bins
+        if rng.random() < 0.5:
+            return rng.uniform(-0.01, 0.01)
+        return (rng.randint(-5, 5)+0.5)*3*eps + rng.uniform(-1.5, 1.5)*eps
+    entries = []
+    index = VectorIndex()
+    for i in range(500):
+        v = Vector([coordinate() for j in range(3)])
+        entries.append(v)
+        index.add(v, i)
+    queries = [Vector([c + rng.uniform(-1.5, 1.5)*eps for c in v]) for v in entries]
+    queries += [Vector([coordinate() for j in range(3)]) for i in range(500)]
+    for q in queries:
+        expected = [i for i in range(len(entries)) if entries[i] == q]
+        assert sorted(index.find(q)) == expected
+        assert (q in index) == (len(expected) > 0)
+
+@pytest.mark.parametrize("x", [0.0, 0.3333, 0.33345, -0.3334, 0.6666, -0.66675, 0.5, 1.0, 0.333])
+def test_improveprecision(x):
+    """Test improveprecision against a scan of floatlist."""
+    expected = x
+    for f in floatlist:
+        if abs(abs(x)-f) <= 0.0002:
+            expected = math.copysign(f, x)
+            break
+    assert improveprecision(x, 0.0002) == expected
+
+def test_improveprecision_extended_floatlist():
+    """Test that values added to floatlist at runtime are recognized."""
+    import cif2cell.utils as utils
+    saved = list(utils.floatlist)
+    try:
+        utils.floatlist.append(0.5)
+        utils.floatlist.append(0.25)
+        assert improveprecision(0.50001, 0.0002) == 0.5
+        assert improveprecision(-0.24999, 0.0002) == -0.25
+        assert improveprecision(0.33334, 0.0002) == 1/3
+    finally:
+        utils.floatlist[:] = saved
+    assert improveprecision(0.50001, 0.0002) == 0.50001
+
+def test_vector_lt():
+    """Test comparison of vectors by length, also with plain sequences."""
+    assert Vector([1, 0, 0]) < Vector([0, 2, 0])
+    assert not Vector([0, 0, 2]) < Vector([1, 1, 1])
+    assert Vector([1, 0, 0]) < [2, 0, 0]
+    assert not Vector([0, 3, 0]) < (1, 1, 1)
+
+def test_symop_key_order():
+    """Test that symmetry operations are ordered independently of set order."""
+    sites = [['x', 'y', 'z'], ['-x', '-y', '-z'], ['y', 'x', 'z+1/2'],
+             ['-y', 'x', '-z'], ['x+1/2', 'y+1/2', 'z'], ['-x', 'y', '1/2-z']]
+    ops = [SymmetryOperation(site) for site in sites]
+    orders = set()
+    for i in range(20):
+        random.Random(i).shuffle(ops)
+        orders.add(tuple(str(op.eqsite) for op in sorted(set(ops), key=lambda op: op.key())))
+    assert len(orders) == 1
+    assert SymmetryOperation(['x', 'y', 'z+1/2']).key() == SymmetryOperation(['x', 'y', 'z+0.50001']).key()
+
+def test_symop_rotation_transpose():
+    """Test that rotation_T follows the rotation, also in copies."""
+    import copy
+    op = SymmetryOperation(['-y', 'x-y', 'z+1/3'])
+    def transposed(m):
+        return tuple(tuple(m[j][i] for j in range(3)) for i in range(3))
+    assert op.rotation_T == transposed(op.rotation)
+    v = Vector([0.1, 0.2, 0.3])
+    assert op.operate(v) == Vector(mvmult3(op.rotation, v)) + op.translation
+    op.rotation = LatticeMatrix([[0, 1, 0], [-1, 0, 0], [0, 0, 1]])
+    assert op.rotation_T == transposed(op.rotation)
+    c = copy.copy(op)
+    assert c.rotation_T == op.rotation_T and c.rotation is op.rotation
+    c.rotation = LatticeMatrix([[1, 0, 0], [0, 1, 0], [0, 0, -1]])
+    assert c.rotation_T == transposed(c.rotation)
+    assert op.rotation_T == transposed(op.rotation) != c.rotation_T
+    op.rotation = None
+    assert op.rotation_T is None
+
+@pytest.mark.parametrize("c,string", [(0, '0'), (2, '2+'), (-3, '3-'), (0.5, '0.5+'), (-1.5, '1.5-'), (2.00001, '2+')])
+def test_charge_string(c, string):
+    """Test the string representation of charges, also after copying and pickling."""
+    import copy
+    import pickle
+    ch = Charge(c)
+    assert str(ch) == string
+    assert float(ch) == float(c)
+    for other in (copy.copy(ch), copy.deepcopy(ch), pickle.loads(pickle.dumps(ch))):
+        assert type(other) == Charge
+        assert str(other) == string
+        assert float(other) == float(c)